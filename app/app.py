@@ -1,19 +1,107 @@
 import streamlit as st
-import pandas as pd
+import streamlit.components.v1 as components
 import re
 import time
-import os
-from io import StringIO
-import pyperclip
-import json
-import requests
+import asyncio
+import hashlib
+import tempfile
+from io import BytesIO
+from collections import deque
+from itertools import islice
+import orjson
+import httpx
+
+OPENAI_API_BASE = "https://api.openai.com/v1"
+OPENAI_CHAT_URL = f"{OPENAI_API_BASE}/chat/completions"
+MAX_CONCURRENT_REQUESTS = 8
+MAX_RETRIES = 5
+LLM_MODEL = "gpt-4o-mini"
+# Bump whenever the system prompt changes so cached responses are not reused
+PROMPT_VERSION = 2
+RESPONSE_CACHE_SIZE = 1024
+_WORD_RE = re.compile(r"\S+")
+# Boundary between prompt and response: a blank line and/or a speaker label
+# such as "Assistant:" or "### Response" at the start of a line
+_SEP_LABEL = r"(?:###[ \t]*(?:Assistant|Response|Output|AI)\b[ \t]*:?|(?:Assistant|Response|Output|AI)[ \t]*:)"
+_SEP_RE = re.compile(rf"(?:\r?\n){{2,}}(?:[ \t]*{_SEP_LABEL})?|^[ \t]*{_SEP_LABEL}", re.MULTILINE | re.IGNORECASE)
+BATCH_POLL_INTERVAL = 30
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+CSV_CHUNK_SIZE = 1000
+# Long texts are sent as head + tail only; the split point sits near the start
+MAX_INPUT_CHARS = 16000
+MAX_COMPLETION_TOKENS = 8192
+TRUNCATION_MARKER = "\n\n[...TRUNCATED...]\n\n"
+# Short CSV rows are packed several to a request. Completion time grows with
+# the total output, so keep both the count and the row size small
+ROWS_PER_REQUEST = 8
+MAX_PACKED_ROW_CHARS = 2000
+MAX_HISTORY = 50
+HISTORY_PAGE_SIZE = 10
+
+DARK_CSS = """
+<style>
+    body {
+        color: #fff;
+        background-color: #262730;
+    }
+    .stTextInput, .stTextArea, .stNumberInput, .stSelectbox, .stRadio, .stCheckbox, .stSlider, .stDateInput, .stTimeInput {
+        background-color: #3d3d4d;
+        color: #fff;
+    }
+   .stButton>button {
+        background-color: #5c5c7a;
+        color: white;
+    }
+     .stButton>button:hover {
+        background-color: #6e6e8a;
+        color: white;
+    }
+    
+    .streamlit-expanderHeader {
+        background-color: #3d3d4d !important;
+        color: #fff !important;
+    }
+    
+     .streamlit-expanderContent {
+         background-color: #3d3d4d !important;
+    }
+    
+    .streamlit-container {
+         background-color: #262730;
+     }
+    
+    .stAlert {
+        background-color: #3d3d4d !important;
+        color: #fff !important;
+    }
+    
+    .stats-text {
+        color: #aaa !important;
+    }
+    
+    .css-10trblm {
+        color: #fff !important;
+    }
+    
+    .css-16idsys {
+        color: #fff !important;
+    }
+    
+    .css-1vq4p4l {
+        color: #fff !important;
+    }
+</style>
+"""
 
 st.set_page_config(page_title="Prompt Output Separator", page_icon="✂️", layout="wide", initial_sidebar_state="expanded")
 
 if 'api_key' not in st.session_state:
     st.session_state.api_key = None
 if 'history' not in st.session_state:
-    st.session_state.history = []
+    # Oldest entries drop off once MAX_HISTORY is reached
+    st.session_state.history = deque(maxlen=MAX_HISTORY)
+if 'history_shown' not in st.session_state:
+    st.session_state.history_shown = HISTORY_PAGE_SIZE
 if 'prompt' not in st.session_state:
     st.session_state.prompt = ""
 if 'output' not in st.session_state:
@@ -22,80 +110,309 @@ if 'title' not in st.session_state:
     st.session_state.title = ""
 if 'mode' not in st.session_state:
     st.session_state.mode = 'light'
+if 'batch_job' not in st.session_state:
+    st.session_state.batch_job = None
+
+def show_more_history():
+    st.session_state.history_shown += HISTORY_PAGE_SIZE
+
+# Button callbacks run before the script reruns, so the state they change is
+# already in place when the page renders and no second rerun is needed
+def clear_history():
+    st.session_state.history.clear()
+    st.session_state.history_shown = HISTORY_PAGE_SIZE
 
+def process_text_file(uploaded_file):
+    try:
+        with st.spinner("Processing..."):
+            content = uploaded_file.getvalue().decode("utf-8")
+            title, prompt, output = separate_prompt_output(content)
+        st.session_state.title = title
+        st.session_state.prompt = prompt
+        st.session_state.output = output
+        st.session_state.history.append(content)
+    except Exception as e:
+        st.error(f"Error processing file: {str(e)}")
+
+def copy_button(text, label):
+    # Mirrors copy_button in versions/_common.py, which this app, run on its
+    # own from app/, cannot import
+    payload = orjson.dumps(text).decode("utf-8").replace("</", "<\\/")
+    components.html(f"""
+<button id="copy" style="width: 100%; padding: 0.4rem; cursor: pointer;">{label}</button>
+<script>
+const text = {payload};
+const button = document.getElementById("copy");
+button.addEventListener("click", async () => {{
+    let copied = false;
+    try {{
+        await navigator.clipboard.writeText(text);
+        copied = true;
+    }} catch (err) {{
+        // Older permission policies block the async API; fall back to a selection copy
+        const area = document.createElement("textarea");
+        area.value = text;
+        document.body.appendChild(area);
+        area.select();
+        copied = document.execCommand("copy");
+        area.remove();
+    }}
+    button.textContent = copied ? "✅ Copied" : "Copy failed, select the text and copy it manually";
+}});
+</script>
+""", height=45)
+
+def _word_count(text):
+    # Counts whitespace-separated tokens without building a list of them
+    return sum(1 for _ in _WORD_RE.finditer(text))
+
+@st.cache_data(max_entries=32, show_spinner=False)
 def count_text_stats(text):
-    words = len(text.split())
+    words = _word_count(text)
     chars = len(text)
     return words, chars
 
+@st.cache_resource(show_spinner=False)
+def get_http_client():
+    # Shared across reruns and sessions so TLS connections to the API are reused
+    return httpx.Client(
+        http2=True,
+        timeout=httpx.Timeout(60.0, connect=5.0),
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=16)
+    )
+
+def build_headers():
+    return {
+        "Authorization": f"Bearer {st.session_state.api_key}",
+        "Content-Type": "application/json"
+    }
+
+def _truncate_for_split(text, max_chars=MAX_INPUT_CHARS):
+    if len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return text[:half] + TRUNCATION_MARKER + text[-half:]
+
+def build_llm_request(text):
+    text = _truncate_for_split(text)
+    return {
+        "model": LLM_MODEL,
+        "messages": [
+            {
+                "role": "system",
+                "content": "Split input verbatim into JSON {title,prompt,output}. Preserve exact text. Title: max 6 words."
+            },
+            {
+                "role": "user",
+                "content": text
+            }
+        ],
+        "temperature": 0,
+        "max_tokens": min(MAX_COMPLETION_TOKENS, max(256, len(text) // 2)),
+        "response_format": {"type": "json_object"}
+    }
+
+def build_chunk_request(texts):
+    items = "\n".join(f"<<<ITEM {i}>>>\n{text}" for i, text in enumerate(texts, 1))
+    return {
+        "model": LLM_MODEL,
+        "messages": [
+            {
+                "role": "system",
+                "content": f"Split each of the {len(texts)} items verbatim. Return JSON {{\"results\": [{{title,prompt,output}}, ...]}}, one entry per item, in order. Preserve exact text. Title: max 6 words."
+            },
+            {
+                "role": "user",
+                "content": items
+            }
+        ],
+        "temperature": 0,
+        "max_tokens": min(MAX_COMPLETION_TOKENS, max(256, len(items) // 2)),
+        "response_format": {"type": "json_object"}
+    }
+
+def basic_split(text):
+    match = _SEP_RE.search(text)
+    if match:
+        return "Untitled Conversation", text[:match.start()].strip(), text[match.end():].strip()
+    return "Untitled Conversation", text.strip(), ""
+
+# Looked up once per call or column and passed down, since every call to a
+# cached function carries some Streamlit bookkeeping
+@st.cache_resource(show_spinner=False)
+def _response_cache():
+    return {}
+
+def _cache_key(text):
+    return hashlib.sha256(f"{LLM_MODEL}:{PROMPT_VERSION}:{text}".encode("utf-8")).hexdigest()
+
+def get_cached_result(cache, text):
+    return cache.get(_cache_key(text))
+
+def store_result(cache, text, result):
+    if not all(v is not None for v in result):
+        return
+    if len(cache) >= RESPONSE_CACHE_SIZE:
+        cache.pop(next(iter(cache)), None)
+    cache[_cache_key(text)] = result
+
+def _split_after_prompt(text, parsed, report=True):
+    # The model only saw a truncated copy, so take its prompt and treat the
+    # rest of the original text as the output
+    prompt = (parsed.get("prompt") or "").strip()
+    start = text.find(prompt) if prompt else -1
+    if start == -1:
+        if report:
+            st.error("Could not locate the prompt in the original text. Using basic split instead.")
+        return None, None, None
+    return parsed.get("title") or "Untitled Conversation", prompt, text[start + len(prompt):].strip()
+
+def is_valid_split(parsed):
+    # The model's reply is untrusted; anything other than text fields would
+    # break the checks below
+    return isinstance(parsed, dict) and all(
+        isinstance(parsed.get(field), (str, type(None))) for field in ("title", "prompt", "output")
+    )
+
+# A failed check returns an empty result rather than a fallback split, so
+# callers fall back themselves and the fallback never reaches the cache
+def check_split(text, parsed, original_words=None, report=True):
+    if len(text) > MAX_INPUT_CHARS:
+        return _split_after_prompt(text, parsed, report)
+    if original_words is None:
+        original_words = _word_count(text)
+    # Verify no content was lost
+    result_words = _word_count(parsed.get("prompt") or "") + _word_count(parsed.get("output") or "")
+    if result_words < original_words * 0.9:  # Allow for 10% difference due to splitting
+        if report:
+            st.error("Content was modified during processing. Using basic split instead.")
+        return None, None, None
+    return parsed.get("title"), parsed.get("prompt"), parsed.get("output")
+
+def parse_llm_content(text, result, original_words=None):
+    try:
+        parsed = orjson.loads(result)
+    except orjson.JSONDecodeError:
+        st.error("Failed to parse LLM response as JSON")
+        return None, None, None
+    if not is_valid_split(parsed):
+        st.error("LLM response did not have the expected fields")
+        return None, None, None
+    return check_split(text, parsed, original_words)
+
+def parse_llm_response(text, response, original_words=None):
+    if response.status_code == 200:
+        return parse_llm_content(text, orjson.loads(response.content)['choices'][0]['message']['content'], original_words)
+    else:
+        st.error(f"API request failed with status code: {response.status_code}")
+        st.error(f"Response: {response.text}")
+        return None, None, None
+
+def retry_delay(response, attempt):
+    # Honour the server's retry-after hint, otherwise back off exponentially
+    retry_after = response.headers.get("retry-after")
+    if retry_after:
+        try:
+            return float(retry_after)
+        except ValueError:
+            pass
+    return min(2 ** attempt, 30)
+
 def analyze_with_llm(text):
     if not st.session_state.api_key:
         st.error("Please provide an OpenAI API key in the sidebar")
         return None, None, None
+    cache = _response_cache()
+    cached = get_cached_result(cache, text)
+    if cached:
+        return cached
+    original_words = _word_count(text)
     try:
-        headers = {
-            "Authorization": f"Bearer {st.session_state.api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": "gpt-4",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": """You are a text separator. Your ONLY job is to split the input text into its original prompt and response components. 
-                    
-CRITICAL RULES:
-- DO NOT summarize or modify ANY text
-- Return the EXACT original text split into two parts
-- Make NO changes to the content
-- Preserve ALL formatting and whitespace
-
-Return ONLY a JSON object with these fields:
-- title: brief descriptive title (max 6 words)
-- prompt: the EXACT, COMPLETE first part of the conversation
-- output: the EXACT, COMPLETE response/answer part"""
-                },
-                {
-                    "role": "user",
-                    "content": f"Split this text into its original parts with NO modifications: {text}"
-                }
-            ],
-            "temperature": 0
-        }
-        
-        response = requests.post(
-            "https://api.openai.com/v1/chat/completions",
-            headers=headers,
-            json=data
+        response = get_http_client().post(
+            OPENAI_CHAT_URL,
+            headers=build_headers(),
+            json=build_llm_request(text)
         )
-        
-        if response.status_code == 200:
-            result = response.json()['choices'][0]['message']['content']
-            try:
-                parsed = json.loads(result)
-                # Verify no content was lost
-                original_words = len(text.split())
-                result_words = len((parsed.get("prompt", "") + parsed.get("output", "")).split())
-                if result_words < original_words * 0.9:  # Allow for 10% difference due to splitting
-                    st.error("Content was modified during processing. Using basic split instead.")
-                    parts = text.split('\n\n', 1)
-                    if len(parts) == 2:
-                        return "Untitled Conversation", parts[0].strip(), parts[1].strip()
-                    return "Untitled Conversation", text.strip(), ""
-                return parsed.get("title"), parsed.get("prompt"), parsed.get("output")
-            except json.JSONDecodeError:
-                st.error("Failed to parse LLM response as JSON")
-                return None, None, None
-        else:
-            st.error(f"API request failed with status code: {response.status_code}")
-            st.error(f"Response: {response.text}")
-            return None, None, None
-            
+        result = parse_llm_response(text, response, original_words)
+        store_result(cache, text, result)
+        return result
     except Exception as e:
         st.error(f"Error analyzing text: {str(e)}")
         return None, None, None
 
+async def _post_with_retries(session, payload):
+    for attempt in range(MAX_RETRIES):
+        response = await session.post(OPENAI_CHAT_URL, headers=build_headers(), json=payload)
+        # No point waiting once the last attempt has been made
+        if response.status_code != 429 and response.status_code < 500 or attempt == MAX_RETRIES - 1:
+            break
+        await asyncio.sleep(retry_delay(response, attempt))
+    return response
+
+async def _analyze_async(session, text, sem, cache):
+    cached = get_cached_result(cache, text)
+    if cached:
+        return cached
+    original_words = _word_count(text)
+    async with sem:
+        try:
+            response = await _post_with_retries(session, build_llm_request(text))
+            result = parse_llm_response(text, response, original_words)
+            store_result(cache, text, result)
+            return result
+        except Exception as e:
+            st.error(f"Error analyzing text: {str(e)}")
+            return None, None, None
+
+async def _analyze_chunk_async(session, texts, sem, cache):
+    # Returns one result per text, or None for any text the reply did not cover
+    async with sem:
+        try:
+            response = await _post_with_retries(session, build_chunk_request(texts))
+            if response.status_code != 200:
+                return [None] * len(texts)
+            results = orjson.loads(orjson.loads(response.content)['choices'][0]['message']['content']).get("results")
+        except Exception:
+            return [None] * len(texts)
+    if not isinstance(results, list) or len(results) != len(texts):
+        return [None] * len(texts)
+    rows = []
+    for text, parsed in zip(texts, results):
+        # A failed entry is not an error yet, since its text is sent again on its own
+        result = check_split(text, parsed, report=False) if is_valid_split(parsed) else None
+        if result and all(v is not None for v in result):
+            store_result(cache, text, result)
+            rows.append(result)
+        else:
+            rows.append(None)
+    return rows
+
+async def _separate_async(session, text, sem, cache):
+    if not text:
+        return "", "", ""
+    title, prompt, output = await _analyze_async(session, text, sem, cache)
+    if all(v is not None for v in [title, prompt, output]):
+        return title, prompt, output
+    return basic_split(text)
+
+async def _separate_column_async(texts, cache):
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+    async with httpx.AsyncClient(timeout=60.0) as session:
+        # Pack short, uncached rows several to a request first
+        short = [text for text in texts if text and len(text) <= MAX_PACKED_ROW_CHARS and get_cached_result(cache, text) is None]
+        chunks = [short[i:i + ROWS_PER_REQUEST] for i in range(0, len(short), ROWS_PER_REQUEST)]
+        packed = {}
+        for chunk, results in zip(chunks, await asyncio.gather(*[_analyze_chunk_async(session, chunk, sem, cache) for chunk in chunks])):
+            packed.update((text, result) for text, result in zip(chunk, results) if result)
+
+        # Everything else, including rows a packed reply could not account
+        # for, is sent on its own
+        rows = [packed.get(text) for text in texts]
+        missing = [i for i, row in enumerate(rows) if row is None]
+        for i, row in zip(missing, await asyncio.gather(*[_separate_async(session, texts[i], sem, cache) for i in missing])):
+            rows[i] = row
+        return rows
+
 def separate_prompt_output(text):
     if not text:
         return "", "", ""
@@ -103,17 +420,123 @@ def separate_prompt_output(text):
         title, prompt, output = analyze_with_llm(text)
         if all(v is not None for v in [title, prompt, output]):
             return title, prompt, output
-    parts = text.split('\n\n', 1)
-    if len(parts) == 2:
-        return "Untitled Conversation", parts[0].strip(), parts[1].strip()
-    return "Untitled Conversation", text.strip(), ""
+    return basic_split(text)
 
 def process_column(column):
-    processed_data = []
-    for item in column:
-        title, prompt, output = separate_prompt_output(str(item))
-        processed_data.append({"Title": title, "Prompt": prompt, "Output": output})
-    return pd.DataFrame(processed_data)
+    import pandas as pd
+    texts = column.astype(object).fillna("").astype(str).reset_index(drop=True)
+    if not st.session_state.api_key:
+        # Every row gets the regex split, so run it over the whole column at once
+        parts = texts.str.split(_SEP_RE, n=1, expand=True).reindex(columns=[0, 1]).fillna("").astype(str)
+        return pd.DataFrame({
+            "Title": texts.where(texts == "", "Untitled Conversation"),
+            "Prompt": parts[0].str.strip(),
+            "Output": parts[1].str.strip()
+        })
+    # Only send each distinct text once; rows are independent, so keep
+    # several requests in flight at once
+    unique_texts = texts.unique().tolist()
+    results = dict(zip(unique_texts, asyncio.run(_separate_column_async(unique_texts, _response_cache()))))
+    return pd.DataFrame([results[text] for text in texts], columns=["Title", "Prompt", "Output"])
+
+def process_column_batch(column):
+    import pandas as pd
+    texts = column.astype(object).fillna("").astype(str)
+    cache = _response_cache()
+    # Submit each distinct, uncached text once and map the results back
+    pending = [text for text in texts.drop_duplicates() if text and get_cached_result(cache, text) is None]
+    replies = run_batch({str(i): text for i, text in enumerate(pending)}) if pending else {}
+    results = {}
+    for i, text in enumerate(pending):
+        if str(i) in replies:
+            results[text] = parse_llm_content(text, replies[str(i)])
+            store_result(cache, text, results[text])
+
+    rows = []
+    for text in texts:
+        if not text:
+            rows.append(("", "", ""))
+            continue
+        title, prompt, output = results.get(text) or get_cached_result(cache, text) or (None, None, None)
+        if all(v is not None for v in [title, prompt, output]):
+            rows.append((title, prompt, output))
+        else:
+            rows.append(basic_split(text))
+    return pd.DataFrame(rows, columns=["Title", "Prompt", "Output"])
+
+def submit_batch(requests_by_id):
+    client = get_http_client()
+    headers = {"Authorization": f"Bearer {st.session_state.api_key}"}
+    with tempfile.NamedTemporaryFile(suffix=".jsonl") as batch_file:
+        for custom_id, text in requests_by_id.items():
+            line = {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": build_llm_request(text)
+            }
+            batch_file.write(orjson.dumps(line) + b"\n")
+        batch_file.seek(0)
+        upload = client.post(
+            f"{OPENAI_API_BASE}/files",
+            headers=headers,
+            data={"purpose": "batch"},
+            files={"file": ("batch.jsonl", batch_file, "application/jsonl")},
+            timeout=120.0
+        )
+    upload.raise_for_status()
+
+    response = client.post(f"{OPENAI_API_BASE}/batches", headers=headers, json={
+        "input_file_id": upload.json()["id"],
+        "endpoint": "/v1/chat/completions",
+        "completion_window": "24h"
+    })
+    response.raise_for_status()
+    return response.json()
+
+def run_batch(requests_by_id):
+    client = get_http_client()
+    headers = {"Authorization": f"Bearer {st.session_state.api_key}"}
+    # Any widget interaction reruns the script and abandons the poll below,
+    # but the batch carries on server-side. Remember it, so processing the
+    # same rows again resumes that batch instead of paying for a second one
+    key = hashlib.sha256(orjson.dumps([LLM_MODEL, PROMPT_VERSION, requests_by_id])).hexdigest()
+    saved = st.session_state.batch_job
+    if saved and saved["key"] == key:
+        response = client.get(f"{OPENAI_API_BASE}/batches/{saved['id']}", headers=headers)
+        response.raise_for_status()
+        batch = response.json()
+    else:
+        if saved:
+            # Superseded by a different set of rows; stop paying for it
+            client.post(f"{OPENAI_API_BASE}/batches/{saved['id']}/cancel", headers=headers)
+        batch = submit_batch(requests_by_id)
+        st.session_state.batch_job = {"key": key, "id": batch["id"]}
+
+    status = st.empty()
+    while batch["status"] not in BATCH_FINAL_STATUSES:
+        counts = batch.get("request_counts") or {}
+        status.info(f"Batch {batch['status']}: {counts.get('completed', 0)}/{counts.get('total', 0)} requests done")
+        time.sleep(BATCH_POLL_INTERVAL)
+        response = client.get(f"{OPENAI_API_BASE}/batches/{batch['id']}", headers=headers)
+        response.raise_for_status()
+        batch = response.json()
+    status.empty()
+    st.session_state.batch_job = None
+
+    if batch["status"] != "completed":
+        raise RuntimeError(f"Batch {batch['id']} ended with status '{batch['status']}'")
+
+    results = {}
+    if batch.get("output_file_id"):
+        output = client.get(f"{OPENAI_API_BASE}/files/{batch['output_file_id']}/content", headers=headers)
+        output.raise_for_status()
+        for line in output.content.splitlines():
+            item = orjson.loads(line)
+            reply = item.get("response") or {}
+            if reply.get("status_code") == 200:
+                results[item["custom_id"]] = reply["body"]['choices'][0]['message']['content']
+    return results
 
 with st.sidebar:
     st.image("https://img.icons8.com/color/96/000000/chat.png", width=50)
@@ -121,12 +544,17 @@ with st.sidebar:
     api_key = st.text_input("Enter OpenAI API Key", type="password", help="Get your API key from platform.openai.com")
     if api_key:
         st.session_state.api_key = api_key
+    st.checkbox("Use Batch API (cheaper, slower)", value=False, key="use_batch_api", help="Send CSV rows through the OpenAI Batch API at half the cost. Results can take a while to come back.")
 
     st.markdown("---")
     st.markdown("## 🎨 Appearance")
     dark_mode = st.checkbox("Dark Mode", value=st.session_state.mode == 'dark')
     st.session_state.mode = 'dark' if dark_mode else 'light'
 
+# Styles go out before the page content so it never renders unstyled first
+if st.session_state.mode == 'dark':
+    st.markdown(DARK_CSS, unsafe_allow_html=True)
+
 st.title("✂️ Prompt Output Separator")
 st.markdown("Utility to assist with separating prompts and outputs when they are recorded in a unified block of text.")
 
@@ -156,50 +584,51 @@ with tabs[0]:
     prompt_words, prompt_chars = count_text_stats(st.session_state.get('prompt', ""))
     st.markdown(f"<p class='stats-text'>Words: {prompt_words} | Characters: {prompt_chars}</p>", unsafe_allow_html=True)
     
-    if st.button("📋 Copy Prompt", use_container_width=True):
-        pyperclip.copy(st.session_state.get('prompt', ""))
-        st.success("Copied prompt to clipboard!")
+    copy_button(st.session_state.get('prompt', ""), "📋 Copy Prompt")
 
     st.markdown("### 🤖 Output")
     output_area = st.text_area("", value=st.session_state.get('output', ""), height=200, key="output_area", help="The extracted output will appear here")
     output_words, output_chars = count_text_stats(st.session_state.get('output', ""))
     st.markdown(f"<p class='stats-text'>Words: {output_words} | Characters: {output_chars}</p>", unsafe_allow_html=True)
     
-    if st.button("📋 Copy Output", use_container_width=True):
-        pyperclip.copy(st.session_state.get('output', ""))
-        st.success("Copied output to clipboard!")
+    copy_button(st.session_state.get('output', ""), "📋 Copy Output")
 
 with tabs[1]:
     st.subheader("Process File")
     uploaded_file = st.file_uploader("Choose a file", type=['txt', 'csv'])
     
     if uploaded_file is not None:
+        import pandas as pd
         try:
             if uploaded_file.type == "text/csv":
-                df = pd.read_csv(uploaded_file)
+                columns = pd.read_csv(uploaded_file, nrows=0).columns.tolist()
                 st.write("Select the column containing the conversations:")
-                column = st.selectbox("Column", df.columns.tolist())
+                column = st.selectbox("Column", columns)
                 if st.button("Process CSV"):
                     with st.spinner("Processing..."):
-                        result_df = process_column(df[column])
+                        uploaded_file.seek(0)
+                        use_batch = st.session_state.api_key and st.session_state.use_batch_api
+                        # A single batch job handles the whole column; otherwise parse
+                        # and process the file a chunk at a time
+                        reader = pd.read_csv(uploaded_file, usecols=[column], dtype=str, chunksize=None if use_batch else CSV_CHUNK_SIZE)
+                        chunks = [reader] if use_batch else reader
+                        buffer = BytesIO()
+                        frames = []
+                        for i, chunk in enumerate(chunks):
+                            processed = process_column_batch(chunk[column]) if use_batch else process_column(chunk[column])
+                            processed.to_csv(buffer, header=(i == 0), index=False)
+                            frames.append(processed)
+                        result_df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=["Title", "Prompt", "Output"])
                         st.write(result_df)
                         st.download_button(
                             "Download Processed CSV",
-                            result_df.to_csv(index=False).encode('utf-8'),
+                            buffer.getvalue(),
                             "processed_conversations.csv",
                             "text/csv",
                             key='download-csv'
                         )
             else:
-                content = StringIO(uploaded_file.getvalue().decode("utf-8")).read()
-                if st.button("Process Text File"):
-                    with st.spinner("Processing..."):
-                        title, prompt, output = separate_prompt_output(content)
-                        st.session_state.title = title
-                        st.session_state.prompt = prompt
-                        st.session_state.output = output
-                        st.session_state.history.append(content)
-                        st.experimental_rerun()
+                st.button("Process Text File", on_click=process_text_file, args=(uploaded_file,))
                         
         except Exception as e:
             st.error(f"Error processing file: {str(e)}")
@@ -207,71 +636,15 @@ with tabs[1]:
 with tabs[2]:
     st.subheader("Processing History")
     if st.session_state.history:
-        if st.button("🗑️ Clear History", type="secondary"):
-            st.session_state.history = []
-            st.experimental_rerun()
+        st.button("🗑️ Clear History", type="secondary", on_click=clear_history)
             
-        for idx, item in enumerate(reversed(st.session_state.history)):
+        for idx, item in enumerate(islice(reversed(st.session_state.history), st.session_state.history_shown)):
             with st.expander(f"Entry {len(st.session_state.history) - idx}", expanded=False):
                 st.text_area("Content", value=item, height=150, key=f"history_{idx}", disabled=True)
+        if len(st.session_state.history) > st.session_state.history_shown:
+            st.button("Load more", on_click=show_more_history)
     else:
         st.info("💡 No processing history available yet. Process some text to see it here.")
 
 st.markdown("---")
 st.markdown("<div style='text-align: center'><p>Created by <a href='https://github.com/danielrosehill/Prompt-And-Output-Separator'>Daniel Rosehill</a></p></div>", unsafe_allow_html=True)
-
-if st.session_state.mode == 'dark':
-    st.markdown("""
-    <style>
-        body {
-            color: #fff;
-            background-color: #262730;
-        }
-        .stTextInput, .stTextArea, .stNumberInput, .stSelectbox, .stRadio, .stCheckbox, .stSlider, .stDateInput, .stTimeInput {
-            background-color: #3d3d4d;
-            color: #fff;
-        }
-       .stButton>button {
-            background-color: #5c5c7a;
-            color: white;
-        }
-         .stButton>button:hover {
-            background-color: #6e6e8a;
-            color: white;
-        }
-        
-        .streamlit-expanderHeader {
-            background-color: #3d3d4d !important;
-            color: #fff !important;
-        }
-        
-         .streamlit-expanderContent {
-             background-color: #3d3d4d !important;
-        }
-        
-        .streamlit-container {
-             background-color: #262730;
-         }
-        
-        .stAlert {
-            background-color: #3d3d4d !important;
-            color: #fff !important;
-        }
-        
-        .stats-text {
-            color: #aaa !important;
-        }
-        
-        .css-10trblm {
-            color: #fff !important;
-        }
-        
-        .css-16idsys {
-            color: #fff !important;
-        }
-        
-        .css-1vq4p4l {
-            color: #fff !important;
-        }
-    </style>
-    """, unsafe_allow_html=True)
\ No newline at end of file
@@ -0,0 +1,648 @@
+import streamlit as st
+import streamlit.components.v1 as components
+import pandas as pd
+import re
+from openai import OpenAI, AsyncOpenAI
+from pydantic import BaseModel
+from typing import List, Optional
+import orjson
+import asyncio
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from streamlit import runtime
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+# Helpers shared by the Streamlit entrypoints in this folder, which import
+# them with `from _common import ...` (streamlit run puts the script's folder
+# on sys.path). The response cache and executor here serve v3; v1 asks a
+# different model with a different prompt, so it keeps its own cache
+
+LLM_MODEL = "gpt-4o-mini"
+# Bump whenever the prompts change so cached replies to the old ones are not reused
+PROMPT_VERSION = 3
+RESPONSE_CACHE_SIZE = 1024
+_WORD_RE = re.compile(r"\S+")
+# A stretch of JSON string content with nothing that needs a closer look
+_STRING_RUN_RE = re.compile(r'[^"\\]+')
+# The schema in the response format enforces the shape, so the prompt only
+# needs to say what goes in each field
+SYSTEM_PROMPT = "Separate input into JSON {title (<=6 words), prompt, output}. Use null if unclear."
+# Structured outputs: the server guarantees a reply with exactly these
+# fields, in this order. The SDK's parse helper takes the model classes
+# below; streamed and Batch API requests send the same schema by hand
+SEPARATION_FORMAT = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "Separation",
+        "strict": True,
+        "schema": {
+            "type": "object",
+            "properties": {
+                "title": {"type": ["string", "null"]},
+                "prompt": {"type": ["string", "null"]},
+                "output": {"type": ["string", "null"]}
+            },
+            "required": ["title", "prompt", "output"],
+            "additionalProperties": False
+        }
+    }
+}
+MAX_CONCURRENT_REQUESTS = 20
+# Short rows are packed several to a request so the system prompt and the
+# round-trip are paid once per chunk instead of once per row
+ROWS_PER_REQUEST = 15
+MAX_PACKED_ROW_CHARS = 2000
+# With the Batch API turned on, columns at least this long go through it:
+# half the price, and OpenAI parallelises the rows server-side, but results
+# can take hours to come back
+BATCH_THRESHOLD = 50
+BATCH_POLL_INTERVAL = 30
+BATCH_FINAL_STATUSES = ("completed", "failed", "expired", "cancelled")
+CSV_CHUNK_SIZE = 1000
+# Direct CSV jobs run off the script thread, at most this many at once
+CSV_WORKERS = 4
+# Streamlit keeps a disconnected session around this long for the tab to
+# reconnect; a job whose session stays gone past it is stopped
+SESSION_GRACE_PERIOD = 120
+
+# Stats text sits just under its text area without overlapping it
+STATS_CSS = """
+<style>
+.stats-text {
+    text-align: left;
+    font-size: 0.8em;
+    color: #888; /* Darker gray to fit the style */
+    margin-top: -10px; /* push the stats closer to the textarea */
+    margin-bottom: 10px;
+}
+</style>
+"""
+
+DARK_CSS = """
+<style>
+    body {
+        color: #fff;
+        background-color: #262730;
+    }
+    .stTextInput, .stTextArea, .stNumberInput, .stSelectbox, .stRadio, .stCheckbox, .stSlider, .stDateInput, .stTimeInput {
+        background-color: #3d3d4d; /* Darker background for input widgets */
+        color: #fff; /* White text for better contrast */
+    }
+   .stButton>button {
+        background-color: #5c5c7a; /* Adjust button color */
+        color: white;
+    }
+     .stButton>button:hover {
+        background-color: #6e6e8a;
+        color: white;
+    }
+
+    .streamlit-expanderHeader {
+        background-color: #3d3d4d !important;
+        color: #fff !important;
+    }
+
+     .streamlit-expanderContent {
+         background-color: #3d3d4d !important;
+    }
+
+    .streamlit-container {
+         background-color: #262730;
+     }
+
+    .stAlert {
+        background-color: #3d3d4d !important;
+        color: #fff !important;
+    }
+
+    .st-ba {
+        background-color: #3d3d4d; /* Makes the body background dark */
+        color: #fff;
+    }
+
+    .css-10trblm {
+        background-color: #3d3d4d;
+         color: #fff;
+    }
+
+    .css-qbe2hs {
+        color: #fff;
+    }
+
+    .css-1wtrr7o {
+        color: #fff;
+    }
+
+    .css-103n16l {
+        color: #fff;
+    }
+
+    .css-10pw50 {
+         color: #fff;
+    }
+
+    .css-z5fcl4 {
+       color: #fff;
+    }
+    .css-1d391kg {
+        color: #fff;
+    }
+</style>
+"""
+
+def copy_button(text, label):
+    # Browsers only allow clipboard access from a click inside the frame that
+    # does the copying, so the button lives in the component alongside the
+    # script and reports whether the copy actually worked
+    payload = orjson.dumps(text).decode("utf-8").replace("</", "<\\/")
+    components.html(f"""
+<button id="copy" style="width: 100%; padding: 0.4rem; cursor: pointer;">{label}</button>
+<script>
+const text = {payload};
+const button = document.getElementById("copy");
+button.addEventListener("click", async () => {{
+    let copied = false;
+    try {{
+        await navigator.clipboard.writeText(text);
+        copied = true;
+    }} catch (err) {{
+        // Older permission policies block the async API; fall back to a selection copy
+        const area = document.createElement("textarea");
+        area.value = text;
+        document.body.appendChild(area);
+        area.select();
+        copied = document.execCommand("copy");
+        area.remove();
+    }}
+    button.textContent = copied ? "✅ Copied" : "Copy failed, select the text and copy it manually";
+}});
+</script>
+""", height=45)
+
+def _word_count(text):
+    # Counts whitespace-separated tokens without building a list of them
+    return sum(1 for _ in _WORD_RE.finditer(text))
+
+# Reruns recount the same prompt and output every time any widget changes
+@st.cache_data(max_entries=64, show_spinner=False)
+def count_text_stats(text):
+    words = _word_count(text)
+    chars = len(text)
+    return words, chars
+
+class Separation(BaseModel):
+    title: Optional[str]
+    prompt: Optional[str]
+    output: Optional[str]
+
+class SeparationList(BaseModel):
+    results: List[Separation]
+
+def build_llm_request(text):
+    return dict(
+        model=LLM_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": text
+            }
+        ],
+        temperature=0,
+        response_format=SEPARATION_FORMAT
+    )
+
+def build_chunk_request(texts):
+    items = "\n".join(f"<<<ITEM {i}>>>\n{text}" for i, text in enumerate(texts, 1))
+    return dict(
+        model=LLM_MODEL,
+        messages=[
+            {
+                "role": "system",
+                "content": f"Separate each of the {len(texts)} items into JSON {{results: [{{title (<=6 words), prompt, output}}, ...]}}, one entry per item, in order. Use null if unclear."
+            },
+            {
+                "role": "user",
+                "content": items
+            }
+        ],
+        temperature=0,
+        response_format=SeparationList
+    )
+
+# A plain dict shared across sessions rather than st.cache_data: the async
+# column path cannot go through a cache_data function, and failed calls
+# must not be cached. CSV workers get the dict passed in, since they cannot
+# call st.* themselves; show_spinner=False keeps lookups free of spinner
+# elements and timer threads
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    return {}
+
+def _cache_key(text):
+    return hashlib.sha256(f"{LLM_MODEL}:{PROMPT_VERSION}:{text}".encode("utf-8")).hexdigest()
+
+def get_cached_result(cache, text):
+    return cache.get(_cache_key(text))
+
+def store_result(cache, text, result):
+    if not all(v is not None for v in result):
+        return
+    if len(cache) >= RESPONSE_CACHE_SIZE:
+        cache.pop(next(iter(cache)), None)
+    cache[_cache_key(text)] = result
+
+def parse_llm_result(result):
+    parsed = orjson.loads(result)
+    return parsed.get("title"), parsed.get("prompt"), parsed.get("output")
+
+class StreamingFieldParser:
+    # Pulls top-level string fields out of a JSON object as it streams in,
+    # without ever parsing the whole buffer. Inside strings, plain runs are
+    # taken in one regex match, so a long output field costs a handful of
+    # slices per chunk rather than a Python step per character
+    def __init__(self):
+        self.fields = {}
+        self.complete = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._chars = []
+        self._key = None
+        self._expect_value = False
+
+    def feed(self, chunk):
+        finished = []
+        i = 0
+        while i < len(chunk):
+            if self._in_string and not self._escaped:
+                run = _STRING_RUN_RE.match(chunk, i)
+                if run:
+                    self._chars.append(run.group())
+                    i = run.end()
+                    continue
+            ch = chunk[i]
+            i += 1
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        value = orjson.loads('"' + "".join(self._chars) + '"')
+                        if self._expect_value:
+                            self.fields[self._key] = value
+                            finished.append(self._key)
+                            self._expect_value = False
+                        else:
+                            self._key = value
+                    continue
+                self._chars.append(ch)
+            elif ch == '"':
+                self._in_string = True
+                self._chars = []
+            elif ch in "{[":
+                self._depth += 1
+            elif ch in "}]":
+                self._depth -= 1
+                self.complete = self._depth == 0
+            elif ch == ":" and self._depth == 1:
+                self._expect_value = True
+            elif ch == "," and self._depth == 1:
+                self._expect_value = False
+        return finished
+
+def analyze_with_llm(text, on_field=None):
+    if not st.session_state.openai_api_key:
+        st.error("Please provide an OpenAI API key in the sidebar")
+        return None, None, None
+    cache = get_response_cache()
+    cached = get_cached_result(cache, text)
+    if cached:
+        return cached
+    try:
+        client = st.session_state.openai_client
+        response = client.chat.completions.create(**build_llm_request(text), stream=True)
+
+        # Hand each field to the caller as soon as its closing quote arrives;
+        # the prompt asks for title first so the short field shows up first
+        parser = StreamingFieldParser()
+        for chunk in response:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            for field in parser.feed(chunk.choices[0].delta.content):
+                if on_field:
+                    on_field(field, parser.fields[field])
+        if not parser.complete:
+            raise ValueError("LLM response ended before the JSON object was complete")
+        result = parser.fields.get("title"), parser.fields.get("prompt"), parser.fields.get("output")
+        store_result(cache, text, result)
+        return result
+    except Exception as e:
+      st.error(f"Error analyzing text: {str(e)}. The error was: {e}")
+      return None, None, None
+
+async def _analyze_async(text, client, sem, cache):
+    cached = get_cached_result(cache, text)
+    if cached:
+        return cached
+    async with sem:
+        try:
+            request = build_llm_request(text)
+            request["response_format"] = Separation
+            response = await client.beta.chat.completions.parse(**request)
+            parsed = response.choices[0].message.parsed
+            result = (parsed.title, parsed.prompt, parsed.output) if parsed else (None, None, None)
+            store_result(cache, text, result)
+            return result
+        except Exception:
+            # Runs on a worker thread with no page to report to; the row
+            # falls back to the plain split
+            return None, None, None
+
+async def _analyze_chunk_async(texts, client, sem, cache):
+    # One result per text, or None for any text the reply did not account for
+    async with sem:
+        try:
+            response = await client.beta.chat.completions.parse(**build_chunk_request(texts))
+            parsed = response.choices[0].message.parsed
+        except Exception:
+            return [None] * len(texts)
+    # The schema fixes the shape of each entry but not how many there are
+    if not parsed or len(parsed.results) != len(texts):
+        return [None] * len(texts)
+    rows = []
+    for text, item in zip(texts, parsed.results):
+        result = item.title, item.prompt, item.output
+        if all(v is not None for v in result):
+            store_result(cache, text, result)
+            rows.append(result)
+        else:
+            rows.append(None)
+    return rows
+
+def basic_split(text):
+    parts = text.split('\n\n', 1)
+    if len(parts) == 2:
+        return "Untitled Conversation", parts[0].strip(), parts[1].strip()
+    return "Untitled Conversation", text.strip(), ""
+
+def quick_split(text):
+    # Inputs simple enough that the LLM would not do better than a plain
+    # split; None when the text needs a real look
+    if len(text) < 200 and '\n\n' not in text:
+        return "Untitled Conversation", text.strip(), ""
+    if text.count('\n\n') == 1:
+        prompt, output = text.split('\n\n')
+        if len(prompt.strip()) > 20 and len(output.strip()) > 20:
+            return "Untitled Conversation", prompt.strip(), output.strip()
+    return None
+
+def separate_prompt_output(text, on_field=None):
+    if not text:
+        return "", "", ""
+    if st.session_state.openai_api_key:
+        quick = None if st.session_state.always_use_llm else quick_split(text)
+        if quick:
+            return quick
+        title, prompt, output = analyze_with_llm(text, on_field)
+        if all(v is not None for v in [title, prompt, output]):
+            return title, prompt, output
+    return basic_split(text)
+
+async def _separate_column_async(texts, api_key, always_use_llm, cache, job):
+    # One client for the whole column; the semaphore caps requests in flight
+    client = AsyncOpenAI(api_key=api_key)
+    sem = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+
+    async def separate_chunk(indices):
+        results = await _analyze_chunk_async([texts[i] for i in indices], client, sem, cache)
+        # Rows the packed reply could not account for are retried on their own
+        missing = [n for n, result in enumerate(results) if result is None]
+        retried = await asyncio.gather(*[_analyze_async(texts[indices[n]], client, sem, cache) for n in missing])
+        for n, result in zip(missing, retried):
+            results[n] = result
+        return indices, results
+
+    async def separate(index):
+        return [index], [await _analyze_async(texts[index], client, sem, cache)]
+
+    # One list per column, filled in place as results arrive in any order
+    titles = [None] * len(texts)
+    prompts = [None] * len(texts)
+    outputs = [None] * len(texts)
+    short = []
+    tasks = []
+    for i, text in enumerate(texts):
+        if not text:
+            result = ("", "", "")
+        else:
+            result = (None if always_use_llm else quick_split(text)) or get_cached_result(cache, text)
+        if result:
+            titles[i], prompts[i], outputs[i] = result
+            job.done += 1
+        elif len(text) <= MAX_PACKED_ROW_CHARS:
+            short.append(i)
+        else:
+            tasks.append(separate(i))
+    tasks += [separate_chunk(short[i:i + ROWS_PER_REQUEST]) for i in range(0, len(short), ROWS_PER_REQUEST)]
+    tasks = [asyncio.ensure_future(task) for task in tasks]
+
+    try:
+        for task in asyncio.as_completed(tasks):
+            indices, results = await task
+            for index, result in zip(indices, results):
+                if not all(v is not None for v in result):
+                    result = basic_split(texts[index])
+                titles[index], prompts[index], outputs[index] = result
+            job.done += len(indices)
+            if job.should_stop():
+                for pending in tasks:
+                    pending.cancel()
+                return None
+    finally:
+        await client.close()
+    return titles, prompts, outputs
+
+class CsvJob:
+    # Progress and cancellation shared between the page and the worker
+    # thread. The worker only sets plain attributes here; it never calls
+    # st.* or reads session state, so everything it needs is passed in.
+    # source identifies the upload and column the job was started for.
+    # Jobs are created on the script thread, so the session is known here
+    def __init__(self, source):
+        self.source = source
+        ctx = get_script_run_ctx()
+        self.session_id = ctx.session_id if ctx else None
+        self.done = 0
+        self.total = 0
+        self.status = "Waiting for a free worker..."
+        self.cancel = threading.Event()
+        self.future = None
+        self._gone_since = None
+
+    def should_stop(self):
+        # Called from the worker: besides an explicit cancel, a job stops
+        # once the tab that started it has been closed for good, since its
+        # result can no longer be shown
+        if not self.cancel.is_set() and self.session_id and runtime.exists():
+            if runtime.get_instance().is_active_session(self.session_id):
+                self._gone_since = None
+            elif self._gone_since is None:
+                self._gone_since = time.monotonic()
+            elif time.monotonic() - self._gone_since > SESSION_GRACE_PERIOD:
+                self.cancel.set()
+        return self.cancel.is_set()
+
+@st.cache_resource(show_spinner=False)
+def get_executor():
+    return ThreadPoolExecutor(max_workers=CSV_WORKERS)
+
+def process_column(column, api_key, always_use_llm, cache, job):
+    texts = column.astype(object).fillna("").astype(str).reset_index(drop=True)
+    if not api_key:
+        # Every row gets the plain split, so run it over the whole column at once
+        parts = texts.str.split('\n\n', n=1, expand=True).reindex(columns=[0, 1]).fillna("").astype(str)
+        return pd.DataFrame({
+            "Title": texts.where(texts == "", "Untitled Conversation"),
+            "Prompt": parts[0].str.strip(),
+            "Output": parts[1].str.strip()
+        })
+    # Only send each distinct text once, then scatter the results back by
+    # each row's position in the unique list
+    codes, unique_texts = pd.factorize(texts)
+    job.done, job.total = 0, len(unique_texts)
+    job.status = f"Separating {len(unique_texts)} distinct rows"
+    columns = asyncio.run(_separate_column_async(unique_texts.tolist(), api_key, always_use_llm, cache, job))
+    if columns is None:
+        return None
+    titles, prompts, outputs = columns
+    return pd.DataFrame({
+        "Title": [titles[code] for code in codes],
+        "Prompt": [prompts[code] for code in codes],
+        "Output": [outputs[code] for code in codes]
+    })
+
+def _run_batch(client, requests_by_id, job):
+    # Returns the parsed reply for each custom id that got one, or None if
+    # the job was cancelled
+    lines = [
+        orjson.dumps({
+            "custom_id": custom_id,
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": build_llm_request(text)
+        })
+        for custom_id, text in requests_by_id.items()
+    ]
+    batch_input = client.files.create(file=("batch.jsonl", b"\n".join(lines)), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=batch_input.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+
+    while batch.status not in BATCH_FINAL_STATUSES:
+        counts = batch.request_counts
+        if counts:
+            job.done, job.total = counts.completed, counts.total
+        job.status = f"Batch {batch.status}"
+        # Waiting on the event rather than sleeping lets Cancel act at once
+        if job.cancel.wait(BATCH_POLL_INTERVAL) or job.should_stop():
+            client.batches.cancel(batch.id)
+            return None
+        batch = client.batches.retrieve(batch.id)
+
+    if batch.status != "completed":
+        raise RuntimeError(f"Batch {batch.id} ended with status '{batch.status}'")
+
+    results = {}
+    if batch.output_file_id:
+        # orjson parses the raw bytes, so the output file is never decoded to str
+        for line in client.files.content(batch.output_file_id).content.splitlines():
+            item = orjson.loads(line)
+            reply = item.get("response") or {}
+            if reply.get("status_code") == 200:
+                try:
+                    results[item["custom_id"]] = parse_llm_result(reply["body"]["choices"][0]["message"]["content"])
+                except ValueError:
+                    pass
+    return results
+
+def process_column_batch(column, client, always_use_llm, cache, job):
+    texts = column.astype(object).fillna("").astype(str).reset_index(drop=True)
+    # Only submit each distinct, uncached text once, then scatter the results
+    # back by each row's position in the unique list
+    codes, unique_texts = pd.factorize(texts)
+    unique_texts = unique_texts.tolist()
+    titles = [""] * len(unique_texts)
+    prompts = [""] * len(unique_texts)
+    outputs = [""] * len(unique_texts)
+    pending = []
+    for i, text in enumerate(unique_texts):
+        if not text:
+            continue
+        result = (None if always_use_llm else quick_split(text)) or get_cached_result(cache, text)
+        if result:
+            titles[i], prompts[i], outputs[i] = result
+        else:
+            pending.append(i)
+
+    if pending:
+        results = _run_batch(client, {str(i): unique_texts[i] for i in pending}, job)
+        if results is None:
+            return None
+        for i in pending:
+            result = results.get(str(i))
+            if result and all(v is not None for v in result):
+                store_result(cache, unique_texts[i], result)
+            else:
+                result = basic_split(unique_texts[i])
+            titles[i], prompts[i], outputs[i] = result
+
+    return pd.DataFrame({
+        "Title": [titles[code] for code in codes],
+        "Prompt": [prompts[code] for code in codes],
+        "Output": [outputs[code] for code in codes]
+    })
+
+def process_csv(data, column, api_key, always_use_llm, use_batch, cache, job):
+    # Runs off the script thread; returns None if the job was cancelled
+    job.status = "Reading CSV"
+    if api_key:
+        # The row count decides between the Batch API and direct calls, so
+        # read the whole column
+        texts = pd.read_csv(data, usecols=[column], dtype=str, engine='c')[column]
+        if use_batch and len(texts) >= BATCH_THRESHOLD:
+            # A client of its own: the sidebar closes the session's client
+            # when the key changes, which would break a batch mid-poll
+            with OpenAI(api_key=api_key) as client:
+                return process_column_batch(texts, client, always_use_llm, cache, job)
+        return process_column(texts, api_key, always_use_llm, cache, job)
+    frames = []
+    for chunk in pd.read_csv(data, usecols=[column], dtype=str, engine='c', chunksize=CSV_CHUNK_SIZE):
+        if job.should_stop():
+            return None
+        frames.append(process_column(chunk[column], api_key, always_use_llm, cache, job))
+        job.status = f"Split {sum(len(frame) for frame in frames)} rows"
+    return pd.concat(frames, ignore_index=True)
+
+def submit_csv_job(job, data, column, api_key, always_use_llm, use_batch, cache):
+    # Direct jobs share the small pool. A Batch API job may be polled for
+    # hours, so it gets a thread of its own rather than holding a shared
+    # worker that other sessions' jobs are queued behind
+    args = (data, column, api_key, always_use_llm, use_batch, cache, job)
+    if use_batch and api_key:
+        executor = ThreadPoolExecutor(max_workers=1)
+        job.future = executor.submit(process_csv, *args)
+        # Lets the thread exit as soon as the job is done
+        executor.shutdown(wait=False)
+    else:
+        job.future = get_executor().submit(process_csv, *args)
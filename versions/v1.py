@@ -1,13 +1,59 @@
 import streamlit as st
-import pandas as pd
 import re
-import time
-import os
-from io import StringIO
-import pyperclip
-import nltk
 from openai import OpenAI
-import json
+import hashlib
+from io import BytesIO
+from _common import StreamingFieldParser, copy_button
+
+LLM_MODEL = "gpt-3.5-turbo-1106"
+# Bump whenever the system prompt changes so cached responses are not reused
+PROMPT_VERSION = 1
+RESPONSE_CACHE_SIZE = 1024
+
+BASE_CSS = """
+<style>
+body {
+    font-family: Arial, sans-serif;
+    color: #333;
+    background-color: #f4f4f9;
+}
+.stTextInput > div > div > input {
+    font-size: 16px;
+}
+.stButton > button {
+    font-size: 16px;
+    padding: 0.5rem 1rem;
+}
+.stMarkdown {
+    font-size: 14px;
+}
+</style>
+"""
+
+DARK_CSS = """
+<style>
+body {
+    color: #fff;
+    background-color: #121212;
+}
+.stTextInput > div > div > input {
+    color: #fff;
+    background-color: #333;
+}
+.stButton > button {
+    color: #fff;
+    background-color: #6200ea;
+}
+.stMarkdown {
+    color: #fff;
+}
+</style>
+"""
+
+# Boundary between prompt and response: a blank line and/or a speaker label
+# such as "Assistant:" or "### Response" at the start of a line
+_SEP_LABEL = r"(?:###[ \t]*(?:Assistant|Response|Output|AI)\b[ \t]*:?|(?:Assistant|Response|Output|AI)[ \t]*:)"
+_SEP_RE = re.compile(rf"(?:\r?\n){{2,}}(?:[ \t]*{_SEP_LABEL})?|^[ \t]*{_SEP_LABEL}", re.MULTILINE | re.IGNORECASE)
 
 # OpenAI configuration
 if 'openai_api_key' not in st.session_state:
@@ -19,18 +65,34 @@ with st.sidebar:
     api_key = st.text_input("Enter OpenAI API Key", type="password")
     if api_key:
         st.session_state.openai_api_key = api_key
-        client = OpenAI(api_key=api_key)
 
-def analyze_with_llm(text):
+@st.cache_resource(show_spinner=False)
+def get_openai_client(api_key):
+    # One client (and connection pool) per API key, reused across calls and reruns
+    return OpenAI(api_key=api_key, timeout=60.0, max_retries=2)
+
+@st.cache_resource(show_spinner=False)
+def _response_cache():
+    return {}
+
+def _cache_key(text):
+    return hashlib.sha256(f"{LLM_MODEL}:{PROMPT_VERSION}:{text}".encode("utf-8")).hexdigest()
+
+def analyze_with_llm(text, on_field=None):
     if not st.session_state.openai_api_key:
         st.error("Please provide an OpenAI API key in the sidebar")
         return None, None
-        
+
+    cache = _response_cache()
+    key = _cache_key(text)
+    if key in cache:
+        return cache[key]
+
     try:
-        client = OpenAI(api_key=st.session_state.openai_api_key)
+        client = get_openai_client(st.session_state.openai_api_key)
         
         response = client.chat.completions.create(
-            model="gpt-3.5-turbo-1106",
+            model=LLM_MODEL,
             messages=[
                 {
                     "role": "system",
@@ -46,44 +108,91 @@ def analyze_with_llm(text):
                 }
             ],
             temperature=0,
-            response_format={ "type": "json_object" }
+            response_format={ "type": "json_object" },
+            stream=True
         )
-        
-        result = response.choices[0].message.content
-        parsed = json.loads(result)
-        return parsed.get("prompt"), parsed.get("output")
+
+        # Hand each field to the caller as soon as its closing quote arrives
+        parser = StreamingFieldParser()
+        for chunk in response:
+            if not chunk.choices or not chunk.choices[0].delta.content:
+                continue
+            for field in parser.feed(chunk.choices[0].delta.content):
+                if on_field:
+                    on_field(field, parser.fields[field])
+        if not parser.complete:
+            raise ValueError("LLM response ended before the JSON object was complete")
+        prompt, output = parser.fields.get("prompt"), parser.fields.get("output")
+        if prompt is not None and output is not None:
+            if len(cache) >= RESPONSE_CACHE_SIZE:
+                cache.pop(next(iter(cache)), None)
+            cache[key] = (prompt, output)
+        return prompt, output
         
     except Exception as e:
         st.error(f"Error analyzing text: {str(e)}")
         return None, None
 
 # Processing function
-def separate_prompt_output(text):
+def separate_prompt_output(text, on_field=None):
     if not text:
         return "", ""
     
     # Use LLM if API key is available
     if st.session_state.openai_api_key:
-        prompt, output = analyze_with_llm(text)
+        prompt, output = analyze_with_llm(text, on_field)
         if prompt is not None and output is not None:
             return prompt, output
     
     # Fallback to basic separation if LLM fails or no API key
-    parts = text.split('\n\n', 1)
-    if len(parts) == 2:
-        return parts[0].strip(), parts[1].strip()
+    match = _SEP_RE.search(text)
+    if match:
+        return text[:match.start()].strip(), text[match.end():].strip()
     return text.strip(), ""
 
 # Column processing function
 def process_column(column):
-    processed_data = []
-    for item in column:
-        prompt, output = separate_prompt_output(str(item))
-        processed_data.append({"Prompt": prompt, "Output": output})
-    return pd.DataFrame(processed_data)
+    import pandas as pd
+    # Identical rows only need to be separated once
+    texts = column.astype(str)
+    results = {text: separate_prompt_output(text) for text in texts.unique()}
+    return pd.DataFrame([results[text] for text in texts], columns=["Prompt", "Output"])
 
-# Download NLTK resources
-nltk.download('punkt')
+def _count_fallbacks(texts):
+    # Texts the LLM answered are in the response cache; the rest fell back
+    cache = _response_cache()
+    return sum(1 for text in set(texts) if text and _cache_key(text) not in cache)
+
+def _parse_and_process(content_bytes, filename):
+    if filename.endswith(".csv"):
+        import pandas as pd
+        df = pd.read_csv(BytesIO(content_bytes), dtype=str)
+        columns = {col: process_column(df[col]) for col in df.columns}
+        texts = [text for col in df.columns for text in df[col].astype(str)]
+        return {"kind": "csv", "columns": columns, "failed": _count_fallbacks(texts)}
+    text = content_bytes.decode("utf-8")
+    return {"kind": "text", "result": separate_prompt_output(text), "failed": _count_fallbacks([text])}
+
+def _upload_key(content_bytes, filename):
+    # The key is part of it so a new key gets a fresh attempt
+    return (
+        hashlib.sha256(content_bytes).hexdigest(),
+        filename,
+        hashlib.sha256(st.session_state.openai_api_key.encode("utf-8")).hexdigest()
+    )
+
+def retry_upload(upload_key):
+    # Answered rows come straight back from the response cache, so only the
+    # ones that fell back are sent again
+    st.session_state.processed_uploads.pop(upload_key, None)
+
+# Uploaded files are re-sent on every rerun. Without an API key the split is
+# deterministic, so cache it by content. With one, each upload is processed
+# once per session and kept in processed_uploads, so rows that fell back are
+# not sent to the API again on every rerun, only when retried
+@st.cache_data(max_entries=8, show_spinner=False)
+def _parse_and_split(content_bytes, filename):
+    return _parse_and_process(content_bytes, filename)
 
 # Session state management
 if 'history' not in st.session_state:
@@ -92,51 +201,15 @@ if 'history' not in st.session_state:
 if 'mode' not in st.session_state:
     st.session_state.mode = 'light'
 
-# Styling
-st.markdown("""
-<style>
-body {
-    font-family: Arial, sans-serif;
-    color: #333;
-    background-color: #f4f4f9;
-}
-.stTextInput > div > div > input {
-    font-size: 16px;
-}
-.stButton > button {
-    font-size: 16px;
-    padding: 0.5rem 1rem;
-}
-.stMarkdown {
-    font-size: 14px;
-}
-</style>
-""", unsafe_allow_html=True)
+if 'processed_uploads' not in st.session_state:
+    st.session_state.processed_uploads = {}
 
 # Dark mode toggle
 if st.sidebar.button("Toggle Dark Mode"):
     st.session_state.mode = 'dark' if st.session_state.mode == 'light' else 'light'
 
-if st.session_state.mode == 'dark':
-    st.markdown("""
-    <style>
-    body {
-        color: #fff;
-        background-color: #121212;
-    }
-    .stTextInput > div > div > input {
-        color: #fff;
-        background-color: #333;
-    }
-    .stButton > button {
-        color: #fff;
-        background-color: #6200ea;
-    }
-    .stMarkdown {
-        color: #fff;
-    }
-    </style>
-    """, unsafe_allow_html=True)
+# Styling, sent as a single element
+st.markdown(BASE_CSS + (DARK_CSS if st.session_state.mode == 'dark' else ""), unsafe_allow_html=True)
 
 # Header
 st.title("Prompt Output Separator")
@@ -165,7 +238,15 @@ with tabs[0]:
         if st.button("Separate Now"):
             if input_text:
                 st.session_state.history.append(input_text)
-                prompt, output = separate_prompt_output(input_text)
+                previews = {"prompt": st.empty(), "output": st.empty()}
+
+                def show_field(field, value):
+                    if field in previews:
+                        previews[field].write(value)
+
+                prompt, output = separate_prompt_output(input_text, show_field)
+                for preview in previews.values():
+                    preview.empty()
                 st.session_state.prompt = prompt
                 st.session_state.output = output
             else:
@@ -180,32 +261,39 @@ with tabs[0]:
         st.text_area("Prompt", value=st.session_state.get('prompt', ""), height=150)
         st.text_area("Output", value=st.session_state.get('output', ""), height=150)
 
-        if st.button("Copy Prompt to Clipboard"):
-            pyperclip.copy(st.session_state.get('prompt', ""))
-            st.success("Copied to clipboard")
+        copy_button(st.session_state.get('prompt', ""), "Copy Prompt to Clipboard")
 
-        if st.button("Copy Output to Clipboard"):
-            pyperclip.copy(st.session_state.get('output', ""))
-            st.success("Copied to clipboard")
+        copy_button(st.session_state.get('output', ""), "Copy Output to Clipboard")
 
 # File Processing Tab
 with tabs[1]:
     st.subheader("File Processing")
     uploaded_files = st.file_uploader("Upload files", type=["txt", "md", "csv"], accept_multiple_files=True)
 
+    # Only uploads still in the uploader are kept
+    kept_uploads = {}
     if uploaded_files:
-        for file in uploaded_files:
-            file_content = file.read().decode("utf-8")
-            if file.name.endswith(".csv"):
-                df = pd.read_csv(StringIO(file_content))
-                for col in df.columns:
-                    processed_df = process_column(df[col])
+        for i, file in enumerate(uploaded_files):
+            if st.session_state.openai_api_key:
+                upload_key = _upload_key(file.getvalue(), file.name)
+                processed = st.session_state.processed_uploads.get(upload_key)
+                if processed is None:
+                    processed = _parse_and_process(file.getvalue(), file.name)
+                kept_uploads[upload_key] = processed
+                if processed["failed"]:
+                    st.warning(f"{file.name}: {processed['failed']} entries fell back to the basic split")
+                    st.button("Retry", key=f"retry_{i}", on_click=retry_upload, args=(upload_key,))
+            else:
+                processed = _parse_and_split(file.getvalue(), file.name)
+            if processed["kind"] == "csv":
+                for col, processed_df in processed["columns"].items():
                     st.write(f"Processed column: {col}")
                     st.write(processed_df)
             else:
-                processed_text = separate_prompt_output(file_content)
+                processed_text = processed["result"]
                 st.write("Processed text file:")
                 st.write({"Prompt": processed_text[0], "Output": processed_text[1]})
+    st.session_state.processed_uploads = kept_uploads
 
 # Footer
 st.markdown("---")
@@ -1,12 +1,25 @@
 import streamlit as st
-import pandas as pd
+import re
 from io import StringIO
-import pyperclip
+from collections import deque
+from itertools import islice
 import openai
+from _common import copy_button
+
+MAX_HISTORY = 50
+HISTORY_PAGE_SIZE = 10
+
+# Boundary between prompt and response: a blank line and/or a speaker label
+# such as "Assistant:" or "### Response" at the start of a line
+_SEP_LABEL = r"(?:###[ \t]*(?:Assistant|Response|Output|AI)\b[ \t]*:?|(?:Assistant|Response|Output|AI)[ \t]*:)"
+_SEP_RE = re.compile(rf"(?:\r?\n){{2,}}(?:[ \t]*{_SEP_LABEL})?|^[ \t]*{_SEP_LABEL}", re.MULTILINE | re.IGNORECASE)
 
 # Initialize session state variables
 if 'history' not in st.session_state:
-    st.session_state.history = []
+    # Oldest entries drop off once MAX_HISTORY is reached
+    st.session_state.history = deque(maxlen=MAX_HISTORY)
+if 'history_shown' not in st.session_state:
+    st.session_state.history_shown = HISTORY_PAGE_SIZE
 if 'prompt' not in st.session_state:
     st.session_state.prompt = ""
 if 'output' not in st.session_state:
@@ -24,6 +37,16 @@ st.markdown("""
     </style>
 """, unsafe_allow_html=True)
 
+def show_more_history():
+    st.session_state.history_shown += HISTORY_PAGE_SIZE
+
+# Button callbacks run before the script reruns, so the state they change is
+# already in place when the page renders and no second rerun is needed
+def clear_history():
+    st.session_state.history.clear()
+    st.session_state.history_shown = HISTORY_PAGE_SIZE
+
+@st.cache_data(max_entries=32, show_spinner=False)
 def count_text_stats(text):
     words = len(text.split())
     chars = len(text)
@@ -39,9 +62,9 @@ def separate_prompt_output(text):
             suggested_title = generate_title_with_llm(prompt, output)
             return suggested_title, prompt, output
     
-    parts = text.split('\n\n', 1)
-    if len(parts) == 2:
-        return "Untitled Conversation", parts[0].strip(), parts[1].strip()
+    match = _SEP_RE.search(text)
+    if match:
+        return "Untitled Conversation", text[:match.start()].strip(), text[match.end():].strip()
     return "Untitled Conversation", text.strip(), ""
 
 def generate_title_with_llm(prompt, output):
@@ -66,6 +89,7 @@ def generate_title_with_llm(prompt, output):
         return "Untitled Conversation"
 
 def process_column(column):
+    import pandas as pd
     processed_data = []
     for item in column:
         title, prompt, output = separate_prompt_output(str(item))
@@ -85,7 +109,6 @@ with tabs[0]:
     
     # Settings
     with st.expander("⚙️ Settings", expanded=False):
-        auto_copy = st.checkbox("Automatically copy prompt to clipboard", value=False)
         st.text_input("OpenAI API Key (optional)", type="password", key="openai_api_key")
     
     # Input area with placeholder
@@ -109,8 +132,6 @@ with tabs[0]:
                     st.session_state.title = title
                     st.session_state.prompt = prompt
                     st.session_state.output = output
-                    if auto_copy:
-                        pyperclip.copy(prompt)
             else:
                 st.error("Please enter some text")
     
@@ -144,9 +165,7 @@ with tabs[0]:
     prompt_words, prompt_chars = count_text_stats(st.session_state.get('prompt', ""))
     st.markdown(f"<p class='stats-text'>Words: {prompt_words} | Characters: {prompt_chars}</p>", unsafe_allow_html=True)
     
-    if st.button("📋 Copy Prompt", use_container_width=True):
-        pyperclip.copy(st.session_state.get('prompt', ""))
-        st.success("Copied prompt to clipboard!")
+    copy_button(st.session_state.get('prompt', ""), "📋 Copy Prompt")
 
     # Output Section
     st.markdown("### 🤖 Output")
@@ -161,9 +180,7 @@ with tabs[0]:
     output_words, output_chars = count_text_stats(st.session_state.get('output', ""))
     st.markdown(f"<p class='stats-text'>Words: {output_words} | Characters: {output_chars}</p>", unsafe_allow_html=True)
     
-    if st.button("📋 Copy Output", use_container_width=True):
-        pyperclip.copy(st.session_state.get('output', ""))
-        st.success("Copied output to clipboard!")
+    copy_button(st.session_state.get('output', ""), "📋 Copy Output")
 
 # File Processing Tab
 with tabs[1]:
@@ -176,6 +193,7 @@ with tabs[1]:
     )
 
     if uploaded_files:
+        import pandas as pd
         for file in uploaded_files:
             with st.expander(f"📄 {file.name}", expanded=True):
                 file_content = file.read().decode("utf-8")
@@ -201,11 +219,9 @@ with tabs[1]:
 with tabs[2]:
     st.subheader("Processing History")
     if st.session_state.history:
-        if st.button("🗑️ Clear History", type="secondary"):
-            st.session_state.history = []
-            st.experimental_rerun()
+        st.button("🗑️ Clear History", type="secondary", on_click=clear_history)
             
-        for idx, item in enumerate(reversed(st.session_state.history)):
+        for idx, item in enumerate(islice(reversed(st.session_state.history), st.session_state.history_shown)):
             with st.expander(f"Entry {len(st.session_state.history) - idx}", expanded=False):
                 st.text_area(
                     "Content",
@@ -214,6 +230,8 @@ with tabs[2]:
                     key=f"history_{idx}",
                     disabled=True
                 )
+        if len(st.session_state.history) > st.session_state.history_shown:
+            st.button("Load more", on_click=show_more_history)
     else:
         st.info("💡 No processing history available yet. Process some text to see it here.")
 
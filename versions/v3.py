@@ -1,12 +1,29 @@
 import streamlit as st
 import pandas as pd
-import re
 import time
-import os
-from io import StringIO
-import pyperclip
 from openai import OpenAI
-import json
+import httpx
+from io import BytesIO
+from collections import deque
+from itertools import islice
+from _common import (
+    BATCH_THRESHOLD,
+    DARK_CSS,
+    STATS_CSS,
+    CsvJob,
+    copy_button,
+    count_text_stats,
+    get_response_cache,
+    separate_prompt_output,
+    submit_csv_job,
+)
+
+# The page reruns this often while a CSV job is in flight to show its progress
+CSV_POLL_INTERVAL = 1
+# Only the most recent entries are kept, and rendered a page at a time
+MAX_HISTORY = 50
+HISTORY_PAGE_SIZE = 10
+HISTORY_PREVIEW_CHARS = 5000
 
 # Page Configuration
 st.set_page_config(
@@ -19,8 +36,12 @@ st.set_page_config(
 # Initialize session state variables
 if 'openai_api_key' not in st.session_state:
     st.session_state.openai_api_key = None
+if 'openai_client' not in st.session_state:
+    st.session_state.openai_client = None
 if 'history' not in st.session_state:
-    st.session_state.history = []
+    st.session_state.history = deque(maxlen=MAX_HISTORY)
+if 'history_shown' not in st.session_state:
+    st.session_state.history_shown = HISTORY_PAGE_SIZE
 if 'prompt' not in st.session_state:
     st.session_state.prompt = ""
 if 'output' not in st.session_state:
@@ -29,58 +50,60 @@ if 'title' not in st.session_state:
     st.session_state.title = ""
 if 'mode' not in st.session_state:
     st.session_state.mode = 'light'
+if 'always_use_llm' not in st.session_state:
+    st.session_state.always_use_llm = False
+if 'use_batch_api' not in st.session_state:
+    st.session_state.use_batch_api = False
+if 'csv_job' not in st.session_state:
+    st.session_state.csv_job = None
 
-def count_text_stats(text):
-    words = len(text.split())
-    chars = len(text)
-    return words, chars
-
-def analyze_with_llm(text):
-    if not st.session_state.openai_api_key:
-        st.error("Please provide an OpenAI API key in the sidebar")
-        return None, None, None
+# Button callbacks run before the script reruns, so the state they change is
+# already in place when the page renders and no second rerun is needed
+def process_text_file(uploaded_file):
     try:
-        client = OpenAI(api_key=st.session_state.openai_api_key)
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo-1106",
-            messages=[
-                {
-                    "role": "system",
-                    "content": """You are a text analysis expert. Your task is to separate a conversation into the prompt/question and the response/answer. Return ONLY a JSON object with three fields: - title: a short, descriptive title for the conversation (max 6 words) - prompt: the user's question or prompt - output: the response or answer If you cannot clearly identify any part, set it to null."""
-                },
-                {
-                    "role": "user",
-                    "content": f"Please analyze this text and separate it into title, prompt and output: {text}"
-                }
-            ],
-            temperature=0,
-            response_format={"type": "json_object"}
-        )
-        result = response.choices[0].message.content
-        parsed = json.loads(result)
-        return parsed.get("title"), parsed.get("prompt"), parsed.get("output")
+        with st.spinner("Processing..."):
+            content = uploaded_file.getvalue().decode("utf-8", errors="replace")
+            title, prompt, output = separate_prompt_output(content)
+        st.session_state.title = title
+        st.session_state.prompt = prompt
+        st.session_state.output = output
+        st.session_state.history.append(content)
     except Exception as e:
-      st.error(f"Error analyzing text: {str(e)}. The error was: {e}")
-      return None, None, None
+        st.error(f"Error processing file: {str(e)}")
+
+def csv_source(uploaded_file, column):
+    return uploaded_file.name, uploaded_file.size, column
+
+def start_csv_job(uploaded_file, column):
+    job = CsvJob(csv_source(uploaded_file, column))
+    # The worker gets its own copy of the upload, since reruns keep reading
+    # the header from the original
+    submit_csv_job(
+        job,
+        BytesIO(uploaded_file.getvalue()),
+        column,
+        st.session_state.openai_api_key,
+        st.session_state.always_use_llm,
+        st.session_state.use_batch_api,
+        get_response_cache()
+    )
+    st.session_state.csv_job = job
 
-def separate_prompt_output(text):
-    if not text:
-        return "", "", ""
-    if st.session_state.openai_api_key:
-        title, prompt, output = analyze_with_llm(text)
-        if all(v is not None for v in [title, prompt, output]):
-            return title, prompt, output
-    parts = text.split('\n\n', 1)
-    if len(parts) == 2:
-        return "Untitled Conversation", parts[0].strip(), parts[1].strip()
-    return "Untitled Conversation", text.strip(), ""
+def cancel_csv_job():
+    st.session_state.csv_job.cancel.set()
 
-def process_column(column):
-    processed_data = []
-    for item in column:
-        title, prompt, output = separate_prompt_output(str(item))
-        processed_data.append({"Title": title, "Prompt": prompt, "Output": output})
-    return pd.DataFrame(processed_data)
+def drop_csv_job():
+    # Stops the job if it is still running and forgets its result
+    if st.session_state.csv_job is not None:
+        st.session_state.csv_job.cancel.set()
+        st.session_state.csv_job = None
+
+def show_more_history():
+    st.session_state.history_shown += HISTORY_PAGE_SIZE
+
+def clear_history():
+    st.session_state.history.clear()
+    st.session_state.history_shown = HISTORY_PAGE_SIZE
 
 # Sidebar configuration
 with st.sidebar:
@@ -88,7 +111,25 @@ with st.sidebar:
     st.markdown("## 🛠️ Configuration")
     api_key = st.text_input("Enter OpenAI API Key", type="password")
     if api_key:
+        # One client (and connection pool) per key, reused across calls and reruns
+        if api_key != st.session_state.openai_api_key or st.session_state.openai_client is None:
+            if st.session_state.openai_client is not None:
+                st.session_state.openai_client.close()
+            st.session_state.openai_client = OpenAI(
+                api_key=api_key,
+                http_client=httpx.Client(limits=httpx.Limits(max_connections=32, max_keepalive_connections=16))
+            )
         st.session_state.openai_api_key = api_key
+    st.checkbox(
+        "Always use LLM",
+        key="always_use_llm",
+        help="Also send short or clearly split texts to the LLM instead of splitting them locally"
+    )
+    st.checkbox(
+        "Use Batch API (cheaper, slower)",
+        key="use_batch_api",
+        help=f"Send CSV columns of {BATCH_THRESHOLD} rows or more through the OpenAI Batch API at half the cost. Results can take hours to come back."
+    )
 
     # Dark mode toggle using checkbox
     st.markdown("---")
@@ -96,10 +137,15 @@ with st.sidebar:
     dark_mode = st.checkbox("Dark Mode", value=st.session_state.mode == 'dark')
     st.session_state.mode = 'dark' if dark_mode else 'light'
 
+# Styling, sent as a single element before the page content so it never
+# renders unstyled first. Streamlit drops any element a rerun does not
+# emit again, so it has to go out on every run
+st.markdown(STATS_CSS + (DARK_CSS if st.session_state.mode == 'dark' else ""), unsafe_allow_html=True)
+
 # Main interface
 st.title("✂️ Prompt Output Separator")
 st.markdown(
-    "Utility to assist with separating prompts and outputs when they are recorded in a unified block of text. For cost-optimisation, uses GPT 3.5.")
+    "Utility to assist with separating prompts and outputs when they are recorded in a unified block of text. For cost-optimisation, uses GPT-4o mini.")
 
 # Tabs with icons
 tabs = st.tabs(["📝 Paste Text", "📁 File Processing", "📊 History"])
@@ -122,7 +168,15 @@ with tabs[0]:
         # Process button
         if st.button("🔄 Process", use_container_width=True) and input_text:
             with st.spinner("Processing..."):
-                title, prompt, output = separate_prompt_output(input_text)
+                previews = {"title": st.empty(), "prompt": st.empty(), "output": st.empty()}
+
+                def show_field(field, value):
+                    if field in previews:
+                        previews[field].write(value)
+
+                title, prompt, output = separate_prompt_output(input_text, show_field)
+                for preview in previews.values():
+                    preview.empty()
                 st.session_state.title = title
                 st.session_state.prompt = prompt
                 st.session_state.output = output
@@ -151,9 +205,7 @@ with tabs[0]:
     prompt_words, prompt_chars = count_text_stats(st.session_state.get('prompt', ""))
     st.markdown(f"<p class='stats-text'>Words: {prompt_words} | Characters: {prompt_chars}</p>", unsafe_allow_html=True)
     
-    if st.button("📋 Copy Prompt", use_container_width=True):
-        pyperclip.copy(st.session_state.get('prompt', ""))
-        st.success("Copied prompt to clipboard!")
+    copy_button(st.session_state.get('prompt', ""), "📋 Copy Prompt")
 
     # Output Section
     st.markdown("### 🤖 Output")
@@ -168,23 +220,35 @@ with tabs[0]:
     output_words, output_chars = count_text_stats(st.session_state.get('output', ""))
     st.markdown(f"<p class='stats-text'>Words: {output_words} | Characters: {output_chars}</p>", unsafe_allow_html=True)
     
-    if st.button("📋 Copy Output", use_container_width=True):
-        pyperclip.copy(st.session_state.get('output', ""))
-        st.success("Copied output to clipboard!")
+    copy_button(st.session_state.get('output', ""), "📋 Copy Output")
 
 # File Processing Tab
 with tabs[1]:
     st.subheader("File Processing")
     uploaded_file = st.file_uploader("Choose a file", type=['txt', 'csv'])
+    if uploaded_file is None or uploaded_file.type != "text/csv":
+        drop_csv_job()
     
     if uploaded_file is not None:
         try:
             if uploaded_file.type == "text/csv":
-                df = pd.read_csv(uploaded_file)
-                column = st.selectbox("Select column to process", df.columns)
-                if st.button("Process CSV"):
-                    with st.spinner("Processing..."):
-                        processed_df = process_column(df[column])
+                # Only the header is needed to offer the columns
+                columns = pd.read_csv(uploaded_file, nrows=0).columns.tolist()
+                column = st.selectbox("Select column to process", columns)
+                # A job's result only applies to the file and column it ran on
+                if st.session_state.csv_job is not None and st.session_state.csv_job.source != csv_source(uploaded_file, column):
+                    drop_csv_job()
+                job = st.session_state.csv_job
+                running = job is not None and not job.future.done()
+                st.button("Process CSV", on_click=start_csv_job, args=(uploaded_file, column), disabled=running)
+                if running:
+                    st.progress(min(job.done / job.total, 1.0) if job.total else 0.0, text=job.status)
+                    st.button("Cancel", on_click=cancel_csv_job, disabled=job.cancel.is_set())
+                elif job is not None:
+                    processed_df = job.future.result()
+                    if processed_df is None:
+                        st.warning("Processing cancelled")
+                    else:
                         st.write(processed_df)
                         st.download_button(
                             "Download Processed CSV",
@@ -193,15 +257,7 @@ with tabs[1]:
                             "text/csv"
                         )
             else:
-                content = uploaded_file.getvalue().decode("utf-8")
-                if st.button("Process Text File"):
-                    with st.spinner("Processing..."):
-                        title, prompt, output = separate_prompt_output(content)
-                        st.session_state.title = title
-                        st.session_state.prompt = prompt
-                        st.session_state.output = output
-                        st.session_state.history.append(content)
-                        st.experimental_rerun()
+                st.button("Process Text File", on_click=process_text_file, args=(uploaded_file,))
         except Exception as e:
             st.error(f"Error processing file: {str(e)}")
 
@@ -209,19 +265,16 @@ with tabs[1]:
 with tabs[2]:
     st.subheader("Processing History")
     if st.session_state.history:
-        if st.button("🗑️ Clear History", type="secondary"):
-            st.session_state.history = []
-            st.experimental_rerun()
+        st.button("🗑️ Clear History", type="secondary", on_click=clear_history)
             
-        for idx, item in enumerate(reversed(st.session_state.history)):
+        for idx, item in enumerate(islice(reversed(st.session_state.history), st.session_state.history_shown)):
             with st.expander(f"Entry {len(st.session_state.history) - idx}", expanded=False):
-                st.text_area(
-                    "Content",
-                    value=item,
-                    height=150,
-                    key=f"history_{idx}",
-                    disabled=True
-                )
+                # Read-only text needs no widget state; long entries are cut
+                # short unless asked for
+                show_full = len(item) > HISTORY_PREVIEW_CHARS and st.checkbox("Show full", key=f"history_full_{idx}")
+                st.code(item if show_full else item[:HISTORY_PREVIEW_CHARS], language=None)
+        if len(st.session_state.history) > st.session_state.history_shown:
+            st.button("Load more", on_click=show_more_history)
     else:
         st.info("💡 No processing history available yet. Process some text to see it here.")
 
@@ -236,89 +289,8 @@ st.markdown(
     unsafe_allow_html=True
 )
 
-# Custom CSS for stats text to prevent them from overlapping
-st.markdown("""
-<style>
-.stats-text {
-    text-align: left;
-    font-size: 0.8em;
-    color: #888; /* Darker gray to fit the style */
-    margin-top: -10px; /* push the stats closer to the textarea */
-    margin-bottom: 10px;
-}
-</style>
-""", unsafe_allow_html=True)
-
-# Custom CSS to style dark mode
-if st.session_state.mode == 'dark':
-    st.markdown("""
-    <style>
-        body {
-            color: #fff;
-            background-color: #262730;
-        }
-        .stTextInput, .stTextArea, .stNumberInput, .stSelectbox, .stRadio, .stCheckbox, .stSlider, .stDateInput, .stTimeInput {
-            background-color: #3d3d4d; /* Darker background for input widgets */
-            color: #fff; /* White text for better contrast */
-        }
-       .stButton>button {
-            background-color: #5c5c7a; /* Adjust button color */
-            color: white;
-        }
-         .stButton>button:hover {
-            background-color: #6e6e8a;
-            color: white;
-        }
-        
-        .streamlit-expanderHeader {
-            background-color: #3d3d4d !important;
-            color: #fff !important;
-        }
-        
-         .streamlit-expanderContent {
-             background-color: #3d3d4d !important;
-        }
-        
-        .streamlit-container {
-             background-color: #262730;
-         }
-        
-        .stAlert {
-            background-color: #3d3d4d !important;
-            color: #fff !important;
-        }
-
-        .st-ba {
-            background-color: #3d3d4d; /* Makes the body background dark */
-            color: #fff;
-        }
-        
-        .css-10trblm {
-            background-color: #3d3d4d;
-             color: #fff;
-        }
-        
-        .css-qbe2hs {
-            color: #fff;
-        }
-        
-        .css-1wtrr7o {
-            color: #fff;
-        }
-        
-        .css-103n16l {
-            color: #fff;
-        }
-        
-        .css-10pw50 {
-             color: #fff;
-        }
-        
-        .css-z5fcl4 {
-           color: #fff;
-        }
-        .css-1d391kg {
-            color: #fff;
-        }
-    </style>
-    """, unsafe_allow_html=True)
\ No newline at end of file
+# Keep rerunning while a CSV job is in flight so its progress stays current;
+# this sits at the end so the rest of the page has rendered first
+if st.session_state.csv_job is not None and not st.session_state.csv_job.future.done():
+    time.sleep(CSV_POLL_INTERVAL)
+    st.experimental_rerun()